@@ -6,19 +6,10 @@ import matplotlib.pyplot as plt
 st.set_page_config(page_title="Sales Dashboard", layout="wide")
 
 from kpi import (
-    avg_sales_per_month,
-    load_tables,
-    calculate_core_kpis,
-    sales_by_year,
-    weekend_sales,
-    top_states_sales,
-    customer_count_segment,
-    monthly_sales_trend,
-    sales_by_quarter,
-    top_5_products,
-    sales_by_region,
-    sales_by_category,
-    sales_by_subcategory
+    fetch_load_version,
+    get_approx_kpi_context,
+    get_kpi_context,
+    load_tables
 )
 
 # Configure logging
@@ -31,13 +22,12 @@ logging.getLogger().addHandler(file_handler)
 logging.getLogger().setLevel(logging.INFO)
 
 
-# Load data once for all pages
-try:
-    fact_df, dim_customer, dim_date, dim_product, dim_region = load_tables()
-    logging.info("Data loaded successfully.")
-except Exception as e:
-    logging.error(f"Error loading data: {e}")
-    st.error("Failed to load data.")
+def get_kpis():
+    """
+    Shared denormalized view; the tables are only re-read after a new ETL load.
+    """
+    # Read the version before the tables, so a load landing mid-read is picked up on the next rerun
+    return get_kpi_context(fetch_load_version(), load_tables)
 
 # Page: Home
 def show_home_page():
@@ -45,23 +35,24 @@ def show_home_page():
         st.title("🏠 Sales Dashboard")
         st.markdown("Welcome to the ***Home Page***. Use the sidebar to navigate through different reports and insights.")
         st.subheader("🔍 Sample Data Preview")
+        previews = get_kpis().previews
 
         # Display Fact Table 
         st.write("Fact Table")
-        st.dataframe(fact_df.head().T)  # Transpose for row-wise display
+        st.dataframe(previews['fact_sales'].T)  # Transpose for row-wise display
 
         # Display Customer Dimension 
         st.write("Customer Dimension")
-        st.dataframe(dim_customer.head().T)  # Transpose for row-wise display
+        st.dataframe(previews['dim_customer'].T)  # Transpose for row-wise display
 
         st.write("Date Dimension")
-        st.dataframe(dim_date.head().T)
+        st.dataframe(previews['dim_date'].T)
 
         st.write("Product Dimension")
-        st.dataframe(dim_product.head().T)
+        st.dataframe(previews['dim_product'].T)
 
         st.write("Region Dimension")
-        st.dataframe(dim_region.head().T)
+        st.dataframe(previews['dim_region'].T)
 
         logging.info("Home page rendered.")
     except Exception as e:
@@ -75,15 +66,32 @@ def show_diagram():
     except Exception as e:
         st.error(f"Error loading image: {e}")
 
+def get_fast_kpis():
+    """
+    Approximate KPI context when fast mode is on and the ETL has written its summaries, else None.
+    Fast mode reads only the ETL's sketches, totals and sample table, never fact_sales.
+    """
+    if st.session_state.get("kpi_mode") != "Fast (approximate)":
+        return None
+    fast = get_approx_kpi_context(fetch_load_version())
+    if fast is None:
+        st.info("Fast mode needs summaries from a newer ETL run; showing exact figures.")
+    return fast
+
 def show_kpi_page():
     try:
+        fast = get_fast_kpis()
+        kpis = fast or get_kpis()
         st.title("📈 KPI Overview")
 
         # Calculate core KPIs
-        total_sales, total_orders, avg_sales = calculate_core_kpis(fact_df)
+        if fast:
+            total_sales, total_orders, avg_sales, total_customers, rel_error = kpis.calculate_core_kpis()
+        else:
+            total_sales, total_orders, avg_sales = kpis.calculate_core_kpis()
 
         # Get average monthly sales and monthly breakdown
-        avg_sales_m = avg_sales_per_month(fact_df, dim_date)
+        avg_sales_m = kpis.avg_sales_per_month()
 
         # Set your target sales (can be based on avg monthly or set manually)
         target_sales = 500000
@@ -91,10 +99,15 @@ def show_kpi_page():
         st.subheader("🔢 Key Performance Indicators")
         col1, col2, col3 = st.columns(3)
         col1.metric("💰 Total Sales", f"${total_sales:,.2f}")
-        col2.metric("🛒 Total Orders", total_orders)
-        col3.metric("📦 Avg Sales/Order", f"${avg_sales:,.2f}")
+        if fast:
+            col2.metric("🛒 Total Orders", f"≈{total_orders:,.0f}", help=f"HyperLogLog estimate, ±{rel_error:.1%} standard error")
+            col3.metric("📦 Avg Sales/Order", f"≈${avg_sales:,.2f}")
+            st.metric("👤 Total Customers", f"≈{total_customers:,.0f}", help=f"HyperLogLog estimate, ±{rel_error:.1%} standard error")
+        else:
+            col2.metric("🛒 Total Orders", total_orders)
+            col3.metric("📦 Avg Sales/Order", f"${avg_sales:,.2f}")
 
-        st.metric("📅 Avg Sales/Month", f"${avg_sales_m:,.2f}")
+        st.metric("📅 Avg Sales/Month", f"{'≈' if fast else ''}${avg_sales_m:,.2f}")
 
         # Sales Target Progress
         st.markdown("---")
@@ -129,8 +142,9 @@ def show_kpi_page():
 # Page: Top Products
 def show_top_products_page():
     try:
+        kpis = get_kpis()
         st.title("🏆 Top 5 Selling Products")
-        top_products = top_5_products(fact_df, dim_product)
+        top_products = kpis.top_5_products()
 
         st.subheader("📊 Product Sales Table")
         st.dataframe(top_products)
@@ -149,9 +163,13 @@ def show_top_products_page():
 
 
 def show_sales_by_region():
+    fast = get_fast_kpis()
+    kpis = fast or get_kpis()
     st.markdown("---")
     st.subheader("🌏 Sales by Region")
-    region_sales = sales_by_region(fact_df, dim_region)
+    region_sales = kpis.sales_by_region()
+    if fast:
+        st.caption(f"Estimated from a {len(kpis.sample):,}-row sample kept by the ETL; Sales_Low/Sales_High give the 95% confidence interval.")
     st.dataframe(region_sales)
 
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -163,9 +181,13 @@ def show_sales_by_region():
 
 
 def show_sales_by_category():
+    fast = get_fast_kpis()
+    kpis = fast or get_kpis()
     st.markdown("---")
     st.subheader("💼 Sales by Category")
-    category_sales = sales_by_category(fact_df, dim_product)
+    category_sales = kpis.sales_by_category()
+    if fast:
+        st.caption(f"Estimated from a {len(kpis.sample):,}-row sample kept by the ETL; Sales_Low/Sales_High give the 95% confidence interval.")
     st.dataframe(category_sales)
 
     fig2, ax2 = plt.subplots(figsize=(12, 6))
@@ -178,7 +200,7 @@ def show_sales_by_category():
     # Sales by Sub-Category
     st.markdown("---")
     st.subheader("📂 Sales by Sub-Category")
-    subcategory_sales = sales_by_subcategory(fact_df, dim_product)
+    subcategory_sales = kpis.sales_by_subcategory()
     st.dataframe(subcategory_sales)
 
     fig2, ax2 = plt.subplots(figsize=(12, 6))
@@ -191,11 +213,12 @@ def show_sales_by_category():
 
 def show_sales_trends_page():
     try:
+        kpis = get_kpis()
         st.title("📊 Sales Trends")
 
         # Monthly Sales
         st.subheader("📅 Monthly Sales Trend")
-        monthly_trend = monthly_sales_trend(fact_df, dim_date)
+        monthly_trend = kpis.monthly_sales_trend()
         fig1, ax1 = plt.subplots(figsize=(20, 5))
         sns.lineplot(data=monthly_trend, x='Month_Year', y='Sales', marker='o', ax=ax1)
         ax1.set_title('Monthly Sales')
@@ -204,7 +227,7 @@ def show_sales_trends_page():
 
         # Quarterly Sales
         st.subheader("📆 Quarterly Sales")
-        q_sales = sales_by_quarter(fact_df, dim_date)
+        q_sales = kpis.sales_by_quarter()
         fig2, ax2 = plt.subplots(figsize=(20, 5))
         sns.barplot(data=q_sales, x='Quarter_Year', y='Sales', palette='Blues_d', ax=ax2)
         ax2.set_title('Quarterly Sales')
@@ -215,7 +238,7 @@ def show_sales_trends_page():
 
         # Yearly Sales
         st.subheader("🗓️ Yearly Sales")
-        yearly = sales_by_year(fact_df, dim_date)
+        yearly = kpis.sales_by_year()
         fig3, ax3 = plt.subplots(figsize=(20, 5))
         sns.barplot(data=yearly, x='Year', y='Sales', palette='coolwarm', ax=ax3)
         ax3.set_title('Yearly Sales')
@@ -223,7 +246,7 @@ def show_sales_trends_page():
 
         # Weekend vs Weekday Pie Chart
         st.subheader("📆 Weekend vs Weekday Sales")
-        weekend_data = weekend_sales(fact_df, dim_date)
+        weekend_data = kpis.weekend_sales()
         fig4, ax4 = plt.subplots(figsize=(5, 5))
         ax4.pie(weekend_data['Sales'], labels=weekend_data['Type'], autopct='%1.1f%%', colors=['#66b3ff', '#ff9999'])
         ax4.set_title('Weekend vs Weekday Sales')
@@ -237,11 +260,12 @@ def show_sales_trends_page():
 # Page: Sales by Segment
 def show_sales_by_segment_page():
     try:
+        kpis = get_kpis()
         st.title("👥 Sales by Segment")
 
         # Top States
         st.subheader("📍 Top 5 States by Sales")
-        top_states = top_states_sales(fact_df, dim_region)
+        top_states = kpis.top_states_sales()
         st.dataframe(top_states)
         fig, ax = plt.subplots(figsize=(20, 7))
         sns.barplot(data=top_states, x='Sales', y='State', palette='viridis', ax=ax)
@@ -250,7 +274,7 @@ def show_sales_by_segment_page():
 
         # Customer Segment
         st.subheader("👤 Customer Segment Distribution")
-        segment_count = customer_count_segment(dim_customer)
+        segment_count = kpis.customer_count_segment()
         fig2, ax2 = plt.subplots(figsize=(20, 7))
         sns.barplot(data=segment_count, x='Segment', y='Customer_Count', palette='pastel', ax=ax2)
         ax2.set_title('Customer Count by Segment')
@@ -266,6 +290,8 @@ def show_sales_by_segment_page():
 # Main navigation
 def main():
     page = st.sidebar.radio("Select a page:", ["Home", "ERD Diagram", "KPI Overview", "Top Products", "Sales Trends", "Sales by Segment", "Sales by Region", "Sales by Category"])
+    st.sidebar.radio("KPI mode:", ["Exact", "Fast (approximate)"], key="kpi_mode",
+                     help="Fast mode reads only the ETL's running sketches, totals and sample table; breakdowns show 95% confidence intervals.")
 
     try:
         if page == "Home":
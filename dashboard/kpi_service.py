@@ -0,0 +1,210 @@
+"""
+Headless KPI service.
+
+Serves the KPI functions from kpi.py as JSON endpoints so reporting jobs and
+alerting can reuse the dashboard logic instead of querying MySQL themselves.
+
+Run with: python dashboard/kpi_service.py --port 8502
+"""
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from kpi import KPIContext, fetch_load_version, load_tables
+
+# Seconds between load-version lookups; bounds how stale a response can be after an ETL run
+VERSION_CHECK_INTERVAL = 5
+
+
+def _core_kpis(context):
+    total_sales, total_orders, avg_sales = context.calculate_core_kpis()
+    return {'total_sales': total_sales, 'total_orders': total_orders, 'avg_sales': avg_sales}
+
+
+ENDPOINTS = {
+    'core_kpis': _core_kpis,
+    'avg_sales_per_month': lambda c: {'avg_sales_per_month': c.avg_sales_per_month()},
+    'sales_by_region': KPIContext.sales_by_region,
+    'sales_by_category': KPIContext.sales_by_category,
+    'sales_by_subcategory': KPIContext.sales_by_subcategory,
+    'customer_count_segment': KPIContext.customer_count_segment,
+    'monthly_sales_trend': KPIContext.monthly_sales_trend,
+    'sales_by_year': KPIContext.sales_by_year,
+    'sales_by_quarter': KPIContext.sales_by_quarter,
+    'weekend_sales': KPIContext.weekend_sales,
+    'top_states_sales': KPIContext.top_states_sales,
+    'top_5_products': KPIContext.top_5_products,
+}
+
+
+class KPICache:
+    """
+    Result cache keyed by (name, load version).
+    Concurrent requests for the same key are coalesced onto a single computation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._inflight = {}
+        self._version = None
+        self._version_checked = 0.0
+
+    def version(self):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._version_checked < VERSION_CHECK_INTERVAL:
+                return self._version
+
+        version = fetch_load_version()
+        with self._lock:
+            if version != self._version:
+                # A new load landed: drop everything computed against older data
+                self._results = {key: value for key, value in self._results.items() if key[1] == version}
+                self._version = version
+                logging.info(f"KPI cache moved to load version {version}.")
+            self._version_checked = time.monotonic()
+        return version
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except Exception as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if key[1] == self._version:
+                self._results[key] = result
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+
+def _json_default(obj):
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.generic):
+        return _replace_nan(obj.item())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _replace_nan(obj):
+    # NaN is not valid JSON; strict clients expect null
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    if isinstance(obj, dict):
+        return {key: _replace_nan(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace_nan(value) for value in obj]
+    return obj
+
+
+def _serialize(result):
+    if isinstance(result, pd.DataFrame):
+        result = result.to_dict(orient='records')
+    return json.dumps(_replace_nan(result), default=_json_default, allow_nan=False).encode('utf-8')
+
+
+cache = KPICache()
+
+
+def _build_context(version):
+    fact_df, dim_customer, dim_date, dim_product, dim_region = load_tables()
+    return KPIContext(fact_df, dim_customer, dim_date, dim_product, dim_region, version=version)
+
+
+def compute_endpoint(name, version):
+    """
+    Return the serialized JSON body for a KPI endpoint at the given load version.
+    """
+    def compute():
+        context = cache.get(('_context', version), lambda: _build_context(version))
+        return _serialize(ENDPOINTS[name](context))
+
+    return cache.get((name, version), compute)
+
+
+class KPIRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip('/')
+        try:
+            if path == '/kpi':
+                self._send_json(200, json.dumps(sorted(ENDPOINTS)).encode('utf-8'))
+                return
+
+            name = path[len('/kpi/'):] if path.startswith('/kpi/') else None
+            if name not in ENDPOINTS:
+                self._send_json(404, json.dumps({'error': f"Unknown endpoint: {path}"}).encode('utf-8'))
+                return
+
+            version = cache.version()
+            etag = f'"v{version}-{name}"'
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            self._send_json(200, compute_endpoint(name, version), etag)
+        except Exception as e:
+            logging.error(f"Error serving {path}: {e}")
+            self._send_json(500, json.dumps({'error': 'Internal error'}).encode('utf-8'))
+
+    def _send_json(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+
+def run(host='127.0.0.1', port=8502):
+    server = ThreadingHTTPServer((host, port), KPIRequestHandler)
+    logging.info(f"KPI service listening on http://{host}:{port}/kpi")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve dashboard KPIs as JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+    run(args.host, args.port)
@@ -1,11 +1,33 @@
 import pandas as pd
+import hashlib
 import logging
-from sqlalchemy import create_engine, text
+import os
+import shutil
+from datetime import datetime
+from sqlalchemy import create_engine, inspect, text
 from config import DATABASE_URL
+from dashboard.sketch import HyperLogLog, sample_fact
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+# Rows committed per transaction during checkpointed loads
+DEFAULT_BATCH_SIZE = 1000
+
+# Share of fact rows copied to fact_sales_sample for the dashboard's fast KPI mode
+KPI_SAMPLE_FRACTION = 0.1
+
+# Tables produced by conform_dimensions, in order; persisted so a resumed load inserts exactly the same rows
+CONFORMED_TABLES = ['dim_customer', 'dim_product', 'dim_shipping', 'dim_region', 'dim_date', 'fact_sales']
+
+# Natural key columns and surrogate key of each dimension, matching create_dimension_tables
+DIMENSION_KEYS = {
+    'dim_customer': (['Customer_ID', 'Customer_Name', 'Segment'], 'CustomerKey'),
+    'dim_product': (['Product_ID', 'Category', 'Sub_Category', 'Product_Name'], 'ProductKey'),
+    'dim_shipping': (['Ship_Mode'], 'ShippingKey'),
+    'dim_region': (['Country', 'City', 'State', 'Postal_Code', 'Region'], 'RegionKey'),
+}
+
 def create_tables(engine):
     """
     Create tables with constraints if they do not exist.
@@ -85,14 +107,353 @@ def create_tables(engine):
             """))
 
             logging.info("Tables created successfully.")
+
+        create_etl_control_tables(engine)
     except Exception as e:
         logging.error(f"Error creating tables: {e}")
         raise
 
 
-def save_and_insert_to_database(engine, dim_customer, dim_product, dim_shipping, dim_region, fact_sales, dim_date):
+def create_etl_control_tables(engine):
+    """
+    Create the ETL bookkeeping tables if they do not exist.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS etl_load_log (
+                    load_seq BIGINT PRIMARY KEY,
+                    source VARCHAR(255),
+                    fact_rows INT,
+                    loaded_at DATETIME
+                );
+            """))
+
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS etl_checkpoint (
+                    load_id VARCHAR(64),
+                    stage VARCHAR(64),
+                    rows_done INT,
+                    completed BOOLEAN,
+                    updated_at DATETIME,
+                    PRIMARY KEY (load_id, stage)
+                );
+            """))
+
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS etl_batch_metrics (
+                    load_id VARCHAR(64) PRIMARY KEY,
+                    files INT,
+                    fact_rows INT,
+                    wait_seconds DOUBLE,
+                    load_seconds DOUBLE,
+                    max_freshness_seconds DOUBLE,
+                    avg_freshness_seconds DOUBLE,
+                    recorded_at DATETIME
+                );
+            """))
+
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS kpi_sketch (
+                    sketch_name VARCHAR(64) PRIMARY KEY,
+                    registers BLOB,
+                    updated_at DATETIME
+                );
+            """))
+
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS kpi_totals (
+                    total_name VARCHAR(64) PRIMARY KEY,
+                    total_value DOUBLE
+                );
+            """))
+
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS fact_sales_sample (
+                    Order_ID VARCHAR(255),
+                    Region VARCHAR(255),
+                    Category VARCHAR(255),
+                    Sub_Category VARCHAR(255),
+                    Year INT,
+                    Month INT,
+                    Sales DOUBLE,
+                    Sample_Fraction DOUBLE
+                );
+            """))
+        logging.info("ETL control tables created successfully.")
+    except Exception as e:
+        logging.error(f"Error creating ETL control tables: {e}")
+        raise
+
+
+def compute_load_id(file_path):
+    """
+    Fingerprint the source file so that a rerun on the same extract resumes the same load.
+    """
+    try:
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except Exception as e:
+        logging.error(f"Failed to fingerprint {file_path}: {e}")
+        raise
+
+
+def _read_checkpoint(conn, load_id, stage):
+    row = conn.execute(
+        text("SELECT rows_done, completed FROM etl_checkpoint WHERE load_id = :load_id AND stage = :stage"),
+        {'load_id': load_id, 'stage': stage}
+    ).fetchone()
+    if row is None:
+        return 0, False
+    return int(row[0]), bool(row[1])
+
+
+def _write_checkpoint(conn, load_id, stage, rows_done, completed):
+    params = {'load_id': load_id, 'stage': stage, 'rows_done': int(rows_done),
+              'completed': completed, 'updated_at': datetime.now()}
+    result = conn.execute(
+        text("UPDATE etl_checkpoint SET rows_done = :rows_done, completed = :completed, updated_at = :updated_at "
+             "WHERE load_id = :load_id AND stage = :stage"),
+        params
+    )
+    if result.rowcount == 0:
+        conn.execute(
+            text("INSERT INTO etl_checkpoint (load_id, stage, rows_done, completed, updated_at) "
+                 "VALUES (:load_id, :stage, :rows_done, :completed, :updated_at)"),
+            params
+        )
+
+
+def record_load(engine, source, fact_rows, load_id=None):
+    """
+    Record a completed load and return its load sequence number.
+    The dashboard KPI service uses the latest sequence number as the data version.
+    With a load_id the record is written at most once per load; a repeat returns None.
+    """
+    try:
+        with engine.begin() as conn:
+            if load_id is not None:
+                _, completed = _read_checkpoint(conn, load_id, 'etl_load_log')
+                if completed:
+                    logging.info(f"Load {load_id} already recorded, skipping.")
+                    return None
+
+            load_seq = conn.execute(text("SELECT COALESCE(MAX(load_seq), 0) + 1 FROM etl_load_log")).scalar()
+            conn.execute(
+                text("INSERT INTO etl_load_log (load_seq, source, fact_rows, loaded_at) "
+                     "VALUES (:load_seq, :source, :fact_rows, :loaded_at)"),
+                {'load_seq': load_seq, 'source': source, 'fact_rows': int(fact_rows),
+                 'loaded_at': datetime.now()}
+            )
+
+            if load_id is not None:
+                _write_checkpoint(conn, load_id, 'etl_load_log', 1, True)
+        logging.info(f"Recorded load {load_seq} from {source}.")
+        return load_seq
+    except Exception as e:
+        logging.error(f"Error recording load: {e}")
+        raise
+
+
+def record_batch_metrics(engine, load_id, metrics):
+    """
+    Store latency and freshness metrics for a watch-mode micro-batch, once per load_id.
+    """
+    try:
+        with engine.begin() as conn:
+            _, completed = _read_checkpoint(conn, load_id, 'etl_batch_metrics')
+            if completed:
+                return
+            conn.execute(
+                text("INSERT INTO etl_batch_metrics (load_id, files, fact_rows, wait_seconds, load_seconds, "
+                     "max_freshness_seconds, avg_freshness_seconds, recorded_at) "
+                     "VALUES (:load_id, :files, :fact_rows, :wait_seconds, :load_seconds, "
+                     ":max_freshness_seconds, :avg_freshness_seconds, :recorded_at)"),
+                dict(metrics, load_id=load_id, recorded_at=datetime.now())
+            )
+            _write_checkpoint(conn, load_id, 'etl_batch_metrics', 1, True)
+    except Exception as e:
+        logging.error(f"Error recording batch metrics: {e}")
+        raise
+
+
+def _summary_rows(conn, fact_sales):
+    """
+    Resolve fact rows to the attributes kept in fact_sales_sample, via the stored dimensions.
+    """
+    lookups = [
+        ("SELECT CustomerKey, Customer_ID FROM dim_customer", 'CustomerKey'),
+        ("SELECT ProductKey, Category, Sub_Category FROM dim_product", 'ProductKey'),
+        ("SELECT RegionKey, Region FROM dim_region", 'RegionKey'),
+        ("SELECT DateKey AS OrderDateKey, Year, Month FROM dim_date", 'OrderDateKey'),
+    ]
+    rows = fact_sales[['Order_ID', 'OrderDateKey', 'CustomerKey', 'ProductKey', 'RegionKey', 'Sales']]
+    for query, key in lookups:
+        rows = rows.merge(pd.read_sql(text(query), con=conn), on=key, how='left')
+    return rows.assign(Sales=rows['Sales'].astype(float))
+
+
+def update_kpi_summary(engine, load_id, fact_sales):
+    """
+    Fold the fact rows of one load into the running summaries behind the dashboard's fast KPI
+    mode: merged HyperLogLog sketches of order and customer IDs, running sales and row totals,
+    and a Bernoulli sample of the rows in fact_sales_sample. Runs once per load_id.
+    While no summary exists yet, it is seeded from every row already in fact_sales instead,
+    so databases loaded before the summaries existed are covered too.
+    """
+    try:
+        with engine.begin() as conn:
+            _, completed = _read_checkpoint(conn, load_id, 'kpi_summary')
+            if completed:
+                logging.info(f"KPI summary already updated for {load_id}, skipping.")
+                return
+
+            if conn.execute(text("SELECT COUNT(*) FROM kpi_totals")).scalar() == 0:
+                logging.info("Seeding KPI summary from the rows already in fact_sales.")
+                fact_sales = pd.read_sql(text("SELECT * FROM fact_sales"), con=conn)
+            rows = _summary_rows(conn, fact_sales)
+
+            seed = int(hashlib.sha1(load_id.encode('utf-8')).hexdigest()[:8], 16)
+            sample = sample_fact(rows, KPI_SAMPLE_FRACTION, seed=seed)[
+                ['Order_ID', 'Region', 'Category', 'Sub_Category', 'Year', 'Month', 'Sales', 'Sample_Fraction']]
+            new_sketches = {
+                'orders': HyperLogLog().add(rows['Order_ID']),
+                'customers': HyperLogLog().add(rows['Customer_ID']),
+            }
+            new_totals = {'sales': float(rows['Sales'].sum()), 'fact_rows': float(len(rows))}
+
+            for sketch_name, sketch in new_sketches.items():
+                registers = conn.execute(text("SELECT registers FROM kpi_sketch WHERE sketch_name = :sketch_name"),
+                                         {'sketch_name': sketch_name}).scalar()
+                if registers is not None:
+                    sketch.merge(HyperLogLog.from_bytes(registers))
+                params = {'sketch_name': sketch_name, 'registers': sketch.to_bytes(), 'updated_at': datetime.now()}
+                if registers is None:
+                    conn.execute(text("INSERT INTO kpi_sketch (sketch_name, registers, updated_at) "
+                                      "VALUES (:sketch_name, :registers, :updated_at)"), params)
+                else:
+                    conn.execute(text("UPDATE kpi_sketch SET registers = :registers, updated_at = :updated_at "
+                                      "WHERE sketch_name = :sketch_name"), params)
+
+            for total_name, value in new_totals.items():
+                params = {'total_name': total_name, 'value': value}
+                result = conn.execute(text("UPDATE kpi_totals SET total_value = total_value + :value "
+                                           "WHERE total_name = :total_name"), params)
+                if result.rowcount == 0:
+                    conn.execute(text("INSERT INTO kpi_totals (total_name, total_value) "
+                                      "VALUES (:total_name, :value)"), params)
+
+            sample.to_sql(name='fact_sales_sample', con=conn, if_exists='append', index=False)
+            _write_checkpoint(conn, load_id, 'kpi_summary', len(sample), True)
+        logging.info(f"KPI summary updated for {load_id} ({len(sample)} sampled rows).")
+    except Exception as e:
+        logging.error(f"Error updating KPI summary: {e}")
+        raise
+
+
+def conform_dimensions(engine, dim_customer, dim_product, dim_shipping, dim_region, dim_date, fact_sales):
+    """
+    Reuse surrogate keys already stored in the database for dimension rows seen in earlier loads,
+    assign fresh keys above the current maximum to new rows, and remap the fact table accordingly.
+    Only new dimension rows are returned, so repeated incremental loads do not collide on keys.
+    """
+    try:
+        fact_sales = fact_sales.copy()
+        dims = {'dim_customer': dim_customer, 'dim_product': dim_product,
+                'dim_shipping': dim_shipping, 'dim_region': dim_region}
+        db_inspector = inspect(engine)
+
+        for table_name, (natural, key) in DIMENSION_KEYS.items():
+            dim = dims[table_name]
+            if db_inspector.has_table(table_name):
+                existing = pd.read_sql(f"SELECT {', '.join(natural + [key])} FROM {table_name}", con=engine)
+            else:
+                existing = pd.DataFrame(columns=natural + [key])
+
+            # Compare as strings: values read back from VARCHAR columns lose their original dtype
+            lookup = existing[natural].astype(str).assign(Existing_Key=existing[key].values)
+            lookup = lookup.drop_duplicates(subset=natural)
+            matched = dim[natural].astype(str).merge(lookup, on=natural, how='left')
+
+            is_new = matched['Existing_Key'].isna().to_numpy()
+            next_key = int(existing[key].max()) + 1 if len(existing) else 1
+            # Explicit copy: without it copy-on-write hands back a read-only view of the frame
+            conformed_keys = matched['Existing_Key'].to_numpy(dtype=float, copy=True)
+            conformed_keys[is_new] = range(next_key, next_key + int(is_new.sum()))
+            conformed_keys = conformed_keys.astype(int)
+
+            fact_sales[key] = fact_sales[key].map(dict(zip(dim[key], conformed_keys)))
+            dims[table_name] = dim.assign(**{key: conformed_keys})[is_new].reset_index(drop=True)
+
+        if db_inspector.has_table('dim_date'):
+            existing_dates = pd.read_sql("SELECT DateKey FROM dim_date", con=engine)['DateKey']
+            dim_date = dim_date[~dim_date['DateKey'].isin(existing_dates)].reset_index(drop=True)
+
+        logging.info("Dimensions conformed against existing database keys.")
+        return (dims['dim_customer'], dims['dim_product'], dims['dim_shipping'], dims['dim_region'],
+                dim_date, fact_sales)
+    except Exception as e:
+        logging.error(f"Error conforming dimensions: {e}")
+        raise
+
+
+def write_conformed_tables(tables_dir, tables):
+    """
+    Persist conformed tables as CSV. Written under a temporary name first so a crash never
+    leaves a half-written directory behind.
+    """
+    tmp_dir = tables_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for table_name, df in zip(CONFORMED_TABLES, tables):
+        df.to_csv(os.path.join(tmp_dir, f"{table_name}.csv"), index=False)
+    os.replace(tmp_dir, tables_dir)
+
+
+def read_conformed_tables(tables_dir):
+    """
+    Read back tables written by write_conformed_tables, in CONFORMED_TABLES order.
+    """
+    return tuple(
+        pd.read_csv(os.path.join(tables_dir, f"{table_name}.csv"),
+                    parse_dates=['Date'] if table_name == 'dim_date' else False)
+        for table_name in CONFORMED_TABLES
+    )
+
+
+def _insert_with_checkpoint(engine, load_id, table_name, df, batch_size):
+    """
+    Insert df in batches, committing each batch in the same transaction as its checkpoint
+    so that every batch lands exactly once across reruns.
+    """
+    with engine.connect() as conn:
+        rows_done, completed = _read_checkpoint(conn, load_id, table_name)
+
+    if completed:
+        logging.info(f"{table_name} already loaded for {load_id}, skipping.")
+        return
+    if rows_done:
+        logging.info(f"Resuming {table_name} at row {rows_done} of {len(df)}.")
+
+    for start in range(rows_done, len(df), batch_size):
+        end = min(start + batch_size, len(df))
+        with engine.begin() as conn:
+            df.iloc[start:end].to_sql(name=table_name, con=conn, if_exists='append', index=False)
+            _write_checkpoint(conn, load_id, table_name, end, False)
+
+    with engine.begin() as conn:
+        _write_checkpoint(conn, load_id, table_name, len(df), True)
+
+
+def save_and_insert_to_database(engine, dim_customer, dim_product, dim_shipping, dim_region, fact_sales, dim_date,
+                                load_id=None, batch_size=DEFAULT_BATCH_SIZE):
     """
     Insert dataframes into database tables without overwriting constraints.
+    When a load_id is given, progress is checkpointed per table and batch, so a rerun
+    with the same load_id skips finished tables and resumes at the first unfinished batch.
     """
     tables = {
         'dim_customer': dim_customer,
@@ -106,7 +467,10 @@ def save_and_insert_to_database(engine, dim_customer, dim_product, dim_shipping,
     for table_name, df in tables.items():
         try:
             logging.info(f"Inserting data into {table_name}...")
-            df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+            if load_id is None:
+                df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+            else:
+                _insert_with_checkpoint(engine, load_id, table_name, df, batch_size)
             logging.info(f"Data inserted successfully into {table_name}.")
         except Exception as e:
             logging.error(f"Error inserting data into {table_name}: {e}")
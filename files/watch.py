@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from files.load import load_data
+from files.transform import clean_columns, preprocess_dates, create_dimension_and_fact_tables, replace_nan_with_mode
+from files.database import (
+    DEFAULT_BATCH_SIZE,
+    compute_load_id,
+    conform_dimensions,
+    create_etl_control_tables,
+    read_conformed_tables,
+    record_batch_metrics,
+    record_load,
+    save_and_insert_to_database,
+    update_kpi_summary,
+    write_conformed_tables
+)
+
+# Marker file written to the inbox while the watcher is behind; producers should pause while it exists
+BACKPRESSURE_MARKER = 'BACKPRESSURE'
+
+
+class InboxWatcher:
+    """
+    Watch an inbox directory for new extract files (*.csv) and micro-batch them
+    through the existing transform and load functions.
+
+    A batch is flushed once `batch_size` files are waiting or the oldest waiting file
+    is `max_latency` seconds old. Producers should write files under another name and
+    rename them to *.csv once complete.
+
+    Claimed files are moved to inbox/working/<batch>/ before loading, so a batch that fails
+    or is interrupted is retried with the same contents and resumes from its checkpoint.
+    The conformed tables of a batch are kept as CSV in `state_dir`, outside the inbox, so
+    producers cannot tamper with them. Loaded batches move to inbox/processed/. A batch that
+    fails `max_attempts` times in a row stops the watcher with an error and stays in working/,
+    so its partial load is resumed rather than left behind once the cause is fixed.
+    """
+
+    def __init__(self, engine, inbox_dir, batch_size=10, max_latency=30.0, poll_interval=1.0,
+                 max_pending=100, max_attempts=3, insert_batch_size=DEFAULT_BATCH_SIZE, state_dir=None):
+        self.engine = engine
+        self.inbox_dir = inbox_dir
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.insert_batch_size = insert_batch_size
+
+        self.working_dir = os.path.join(inbox_dir, 'working')
+        self.processed_dir = os.path.join(inbox_dir, 'processed')
+        self.state_dir = state_dir or os.path.abspath(inbox_dir).rstrip(os.sep) + '.state'
+        for directory in (self.working_dir, self.processed_dir, self.state_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        self.backpressure = False
+        self.attempts = {}
+        self.stats = {'batches': 0, 'files': 0, 'fact_rows': 0, 'failures': 0,
+                      'backpressure_events': 0, 'last_freshness_seconds': None, 'max_freshness_seconds': None}
+
+        create_etl_control_tables(engine)
+
+    def run(self, stop_event=None, max_batches=None):
+        """
+        Poll the inbox until stop_event is set or max_batches batches have been loaded.
+        """
+        stop_event = stop_event or threading.Event()
+        logging.info(f"Watching {self.inbox_dir} (batch_size={self.batch_size}, max_latency={self.max_latency}s).")
+        while not stop_event.is_set():
+            loaded = self.run_once()
+            if max_batches is not None and self.stats['batches'] >= max_batches:
+                break
+            # While behind, keep draining without sleeping between batches
+            if not (loaded and self.backpressure):
+                stop_event.wait(self.poll_interval)
+
+    def run_once(self):
+        """
+        Load at most one micro-batch. Returns True if a batch was loaded.
+        """
+        pending = self._pending_files()
+        self._update_backpressure(len(pending) + len(self._working_batches()) * self.batch_size)
+
+        batch_dir = self._next_batch(pending)
+        if batch_dir is None:
+            return False
+
+        try:
+            self._load_batch(batch_dir)
+            return True
+        except Exception as e:
+            self.stats['failures'] += 1
+            attempts = self.attempts.get(batch_dir, 0) + 1
+            self.attempts[batch_dir] = attempts
+            logging.error(f"Micro-batch {os.path.basename(batch_dir)} failed (attempt {attempts}): {e}")
+            if attempts >= self.max_attempts:
+                raise RuntimeError(f"Micro-batch {os.path.basename(batch_dir)} failed {attempts} times; "
+                                   f"fix the cause and restart to resume it from its checkpoint") from e
+            return False
+
+    def _pending_files(self):
+        pending = []
+        for entry in os.scandir(self.inbox_dir):
+            if not (entry.is_file() and entry.name.endswith('.csv')):
+                continue
+            try:
+                pending.append((entry.stat().st_mtime, entry.name, entry.path))
+            except FileNotFoundError:
+                # Removed by the producer since the scan; the next poll rescans
+                continue
+        return [path for _, _, path in sorted(pending)]
+
+    def _working_batches(self):
+        return sorted(entry.path for entry in os.scandir(self.working_dir) if entry.is_dir())
+
+    def _update_backpressure(self, backlog):
+        marker = os.path.join(self.inbox_dir, BACKPRESSURE_MARKER)
+        if not self.backpressure and backlog > self.max_pending:
+            self.backpressure = True
+            self.stats['backpressure_events'] += 1
+            with open(marker, 'w') as f:
+                f.write(f"{backlog} files waiting\n")
+            logging.warning(f"Backpressure on: {backlog} files waiting (limit {self.max_pending}).")
+        elif self.backpressure and backlog <= self.max_pending // 2:
+            self.backpressure = False
+            if os.path.exists(marker):
+                os.remove(marker)
+            logging.info(f"Backpressure off: {backlog} files waiting.")
+
+    def _next_batch(self, pending):
+        # Unfinished batches from an earlier failure or restart always go first
+        working = self._working_batches()
+        if working:
+            return working[0]
+
+        if not pending:
+            return None
+        try:
+            oldest_wait = time.time() - os.path.getmtime(pending[0])
+        except FileNotFoundError:
+            return None
+        if len(pending) < self.batch_size and oldest_wait < self.max_latency:
+            return None
+
+        batch_dir = os.path.join(self.working_dir, datetime.now().strftime('%Y%m%d%H%M%S%f'))
+        os.makedirs(batch_dir)
+        claimed = 0
+        for path in pending[:self.batch_size]:
+            try:
+                # os.replace keeps the mtime, which is used as the arrival time for freshness
+                os.replace(path, os.path.join(batch_dir, os.path.basename(path)))
+                claimed += 1
+            except FileNotFoundError:
+                logging.warning(f"{os.path.basename(path)} vanished before it was claimed, skipping.")
+        if not claimed:
+            os.rmdir(batch_dir)
+            return None
+        return batch_dir
+
+    def _load_batch(self, batch_dir):
+        started = time.time()
+        files = sorted(os.path.join(batch_dir, name) for name in os.listdir(batch_dir) if name.endswith('.csv'))
+        if not files:
+            # Left behind by an interrupted claim before any file was moved
+            shutil.rmtree(batch_dir)
+            return
+        arrivals = [os.path.getmtime(path) for path in files]
+
+        digest = hashlib.sha1()
+        for path in files:
+            digest.update(os.path.basename(path).encode('utf-8'))
+            digest.update(compute_load_id(path).encode('utf-8'))
+        load_id = digest.hexdigest()
+
+        # Cleaning is deterministic and cheap, so it is redone on retries; conforming is not, so its result is kept
+        df = pd.concat([load_data(path) for path in files], ignore_index=True)
+        df = clean_columns(df)
+        df = preprocess_dates(df)
+        df = replace_nan_with_mode(df)
+
+        tables_dir = os.path.join(self.state_dir, os.path.basename(batch_dir))
+        if os.path.isdir(tables_dir):
+            tables = read_conformed_tables(tables_dir)
+        else:
+            tables = conform_dimensions(self.engine, *create_dimension_and_fact_tables(df))
+            write_conformed_tables(tables_dir, tables)
+        dim_customer, dim_product, dim_shipping, dim_region, dim_date, fact_sales = tables
+
+        save_and_insert_to_database(self.engine, dim_customer, dim_product, dim_shipping, dim_region,
+                                    fact_sales, dim_date, load_id=load_id, batch_size=self.insert_batch_size)
+        update_kpi_summary(self.engine, load_id, fact_sales)
+        record_load(self.engine, os.path.basename(batch_dir), len(fact_sales), load_id=load_id)
+
+        finished = time.time()
+        freshness = [finished - arrival for arrival in arrivals]
+        metrics = {
+            'files': len(files),
+            'fact_rows': len(fact_sales),
+            'wait_seconds': started - min(arrivals),
+            'load_seconds': finished - started,
+            'max_freshness_seconds': max(freshness),
+            'avg_freshness_seconds': sum(freshness) / len(freshness),
+        }
+        record_batch_metrics(self.engine, load_id, metrics)
+
+        shutil.rmtree(tables_dir)
+        shutil.move(batch_dir, self.processed_dir)
+        self.attempts.pop(batch_dir, None)
+
+        self.stats['batches'] += 1
+        self.stats['files'] += len(files)
+        self.stats['fact_rows'] += len(fact_sales)
+        self.stats['last_freshness_seconds'] = metrics['max_freshness_seconds']
+        self.stats['max_freshness_seconds'] = max(self.stats['max_freshness_seconds'] or 0,
+                                                  metrics['max_freshness_seconds'])
+        logging.info(f"Micro-batch {os.path.basename(batch_dir)} loaded: {len(files)} files, "
+                     f"{len(fact_sales)} rows, freshness {metrics['max_freshness_seconds']:.1f}s.")
@@ -1,8 +1,13 @@
+import argparse
 import logging
+import os
+import shutil
 from sqlalchemy import create_engine
 from files.load import load_data
 from files.transform import clean_columns, preprocess_dates, create_dimension_and_fact_tables, replace_nan_with_mode
-from files.database import save_and_insert_to_database, create_tables
+from files.database import (save_and_insert_to_database, create_tables, record_load, update_kpi_summary, compute_load_id,
+                            conform_dimensions, read_conformed_tables, write_conformed_tables)
+from files.watch import InboxWatcher
 from config import DATABASE_URL
 
 # Logging setup
@@ -25,26 +30,67 @@ def load_and_clean_data(file_path):
         logging.error(f"Data load/clean failed: {e}")
         raise
 
-if __name__ == "__main__":
-    file_path = 'train.csv'
-    try:  
-
-        engine = create_engine(DATABASE_URL)
+# Conformed tables of an unfinished one-shot load are kept here, one directory per load_id
+DEFAULT_STATE_DIR = '.etl_state'
 
+def run_etl(engine, file_path, state_dir=DEFAULT_STATE_DIR):
+    """
+    Run the one-shot ETL for a single extract file.
+    """
+    try:
         # Load and clean data
         df = load_and_clean_data(file_path)
 
-        # Create dimension and fact tables
-        dims_and_fact = create_dimension_and_fact_tables(df)
-        dim_customer, dim_product, dim_shipping, dim_region, dim_date, fact_sales = dims_and_fact
-
         # Create tables in DB
         create_tables(engine)
 
-        # Insert data
-        save_and_insert_to_database(engine, dim_customer, dim_product, dim_shipping, dim_region, fact_sales, dim_date)
+        # Create dimension and fact tables, reusing the keys of rows already loaded (e.g. by watch mode).
+        # The conformed tables are kept until the load finishes so a rerun inserts exactly the same rows.
+        load_id = compute_load_id(file_path)
+        tables_dir = os.path.join(state_dir, load_id)
+        if os.path.isdir(tables_dir):
+            tables = read_conformed_tables(tables_dir)
+        else:
+            tables = conform_dimensions(engine, *create_dimension_and_fact_tables(df))
+            write_conformed_tables(tables_dir, tables)
+        dim_customer, dim_product, dim_shipping, dim_region, dim_date, fact_sales = tables
+
+        # Insert data, resuming from the last checkpoint if this file was partially loaded before
+        save_and_insert_to_database(engine, dim_customer, dim_product, dim_shipping, dim_region, fact_sales, dim_date,
+                                    load_id=load_id)
+        update_kpi_summary(engine, load_id, fact_sales)
+
+        # Bump the data version so KPI consumers drop stale results
+        record_load(engine, file_path, len(fact_sales), load_id=load_id)
+        shutil.rmtree(tables_dir)
 
         logging.info("ETL process completed successfully.")
     except Exception as e:
         logging.error(f"ETL process failed: {e}")
-        print("ETL failed. Check logs.")
+        print("ETL failed. Check logs. Rerun to resume from the last checkpoint.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load sales extracts into the star schema.")
+    parser.add_argument('--file', default='train.csv', help="Extract file for a one-shot run.")
+    parser.add_argument('--watch', metavar='INBOX', help="Watch an inbox directory and micro-batch new files.")
+    parser.add_argument('--batch-size', type=int, default=10, help="Max files per micro-batch.")
+    parser.add_argument('--max-latency', type=float, default=30.0, help="Max seconds a file waits before its batch is flushed.")
+    parser.add_argument('--max-pending', type=int, default=100, help="Backlog size that turns on backpressure.")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+
+    if args.watch:
+        try:
+            create_tables(engine)
+            watcher = InboxWatcher(engine, args.watch, batch_size=args.batch_size,
+                                   max_latency=args.max_latency, max_pending=args.max_pending)
+            watcher.run()
+        except KeyboardInterrupt:
+            logging.info("Watch mode stopped.")
+        except Exception as e:
+            logging.error(f"Watch mode failed: {e}")
+            print("Watch mode failed. Check logs. Restart to resume the unfinished batch from its checkpoint.")
+    else:
+        run_etl(engine, args.file)
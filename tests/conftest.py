@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run the tests against the modules in the repository root, as `python main.py` does,
+# and make the dashboard modules importable the way `streamlit run dashboard/app.py` does
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, 'dashboard'))
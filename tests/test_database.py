@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from files.database import create_etl_control_tables, save_and_insert_to_database, update_kpi_summary
+
+
+def count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sales.db'}")
+    create_etl_control_tables(engine)
+    return engine
+
+
+def totals(engine):
+    return dict(pd.read_sql("SELECT total_name, total_value FROM kpi_totals", engine).itertuples(index=False))
+
+
+def make_tables(fact_rows):
+    dim_customer = pd.DataFrame({'Customer_ID': ['C-1'], 'Customer_Name': ['Name C-1'],
+                                 'Segment': ['Consumer'], 'CustomerKey': [1]})
+    dim_product = pd.DataFrame({'Product_ID': ['P-1'], 'Category': ['Furniture'], 'Sub_Category': ['Chairs'],
+                                'Product_Name': ['Product P-1'], 'ProductKey': [1]})
+    dim_shipping = pd.DataFrame({'Ship_Mode': ['Second Class'], 'ShippingKey': [1]})
+    dim_region = pd.DataFrame({'Country': ['United States'], 'City': ['Henderson'], 'State': ['Kentucky'],
+                               'Postal_Code': [42420], 'Region': ['South'], 'RegionKey': [1]})
+    dim_date = pd.DataFrame({'DateKey': [20171108], 'Date': [pd.Timestamp('2017-11-08')], 'Month': [11],
+                             'Year': [2017]})
+    fact_sales = pd.DataFrame({'Order_ID': [f"O-{i}" for i in range(fact_rows)], 'OrderDateKey': 20171108,
+                               'CustomerKey': 1, 'ProductKey': 1, 'ShippingKey': 1, 'RegionKey': 1,
+                               'Sales': [float(i) for i in range(fact_rows)]})
+    return dim_customer, dim_product, dim_shipping, dim_region, fact_sales, dim_date
+
+
+def test_insert_resumes_after_mid_table_failure(engine, monkeypatch):
+    tables = make_tables(fact_rows=10)
+    to_sql = pd.DataFrame.to_sql
+    fact_batches = []
+
+    def failing_to_sql(df, name, *args, **kwargs):
+        if name == 'fact_sales':
+            fact_batches.append(len(df))
+            if len(fact_batches) == 3:
+                raise RuntimeError("connection lost")
+        return to_sql(df, name, *args, **kwargs)
+
+    monkeypatch.setattr(pd.DataFrame, 'to_sql', failing_to_sql)
+    with pytest.raises(RuntimeError):
+        save_and_insert_to_database(engine, *tables, load_id='load-1', batch_size=3)
+    assert count(engine, 'fact_sales') == 6
+    monkeypatch.setattr(pd.DataFrame, 'to_sql', to_sql)
+
+    save_and_insert_to_database(engine, *tables, load_id='load-1', batch_size=3)
+
+    fact = pd.read_sql("SELECT Order_ID FROM fact_sales", engine)
+    assert sorted(fact['Order_ID']) == sorted(tables[4]['Order_ID'])
+    assert count(engine, 'dim_customer') == 1
+
+    # A third run of a finished load inserts nothing
+    save_and_insert_to_database(engine, *tables, load_id='load-1', batch_size=3)
+    assert count(engine, 'fact_sales') == 10
+
+
+def test_kpi_summary_matches_inserted_fact_rows_once(engine):
+    tables = make_tables(fact_rows=200)
+    save_and_insert_to_database(engine, *tables, load_id='load-1')
+    update_kpi_summary(engine, 'load-1', tables[4])
+    update_kpi_summary(engine, 'load-1', tables[4])
+
+    fact = pd.read_sql("SELECT Sales FROM fact_sales", engine)
+    assert totals(engine) == pytest.approx({'sales': fact['Sales'].sum(), 'fact_rows': len(fact)})
+    assert count(engine, 'kpi_sketch') == 2
+
+    sample = pd.read_sql("SELECT * FROM fact_sales_sample", engine)
+    assert 0 < len(sample) < 200
+    assert set(sample['Region']) == {'South'}
+    assert set(sample['Sub_Category']) == {'Chairs'}
+    assert set(zip(sample['Year'], sample['Month'])) == {(2017, 11)}
+
+
+def test_kpi_summary_is_seeded_from_existing_fact_rows(engine):
+    # Rows loaded before the summaries existed
+    first = make_tables(fact_rows=50)
+    save_and_insert_to_database(engine, *first, load_id='load-1')
+
+    second = make_tables(fact_rows=30)
+    second[4]['Order_ID'] = [f"N-{i}" for i in range(30)]
+    empty = tuple(df.iloc[0:0] for df in second[:4])
+    save_and_insert_to_database(engine, *empty, second[4], second[5].iloc[0:0], load_id='load-2')
+    update_kpi_summary(engine, 'load-2', second[4])
+
+    assert totals(engine)['fact_rows'] == 80
+    assert totals(engine)['sales'] == pytest.approx(first[4]['Sales'].sum() + second[4]['Sales'].sum())
+
+    # Later loads only add their own rows
+    third = make_tables(fact_rows=5)
+    third[4]['Order_ID'] = [f"T-{i}" for i in range(5)]
+    save_and_insert_to_database(engine, *empty, third[4], third[5].iloc[0:0], load_id='load-3')
+    update_kpi_summary(engine, 'load-3', third[4])
+    assert totals(engine)['fact_rows'] == 85
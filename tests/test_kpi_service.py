@@ -0,0 +1,18 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from kpi_service import _serialize
+
+
+def test_serialize_maps_nan_to_null():
+    body = _serialize({'avg_sales_per_month': float('nan'), 'total_orders': np.int64(3)})
+    assert json.loads(body) == {'avg_sales_per_month': None, 'total_orders': 3}
+
+
+def test_serialize_dataframe_with_missing_values_is_strict_json():
+    df = pd.DataFrame({'Region': ['East', None], 'Sales': [1.5, np.nan]})
+    body = _serialize(df).decode('utf-8')
+    assert 'NaN' not in body
+    assert json.loads(body) == [{'Region': 'East', 'Sales': 1.5}, {'Region': None, 'Sales': None}]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.sketch import HyperLogLog, estimate_group_sales, sample_fact
+
+
+@pytest.mark.parametrize('n', [100, 5000, 200000])
+def test_hyperloglog_estimate_is_within_error_bound(n):
+    sketch = HyperLogLog().add([f"ID-{i}" for i in range(n)])
+    assert abs(sketch.estimate() - n) / n < 3 * sketch.relative_error()
+
+
+def test_hyperloglog_ignores_duplicates():
+    values = [f"ID-{i % 1000}" for i in range(20000)]
+    sketch = HyperLogLog().add(values)
+    assert abs(sketch.estimate() - 1000) / 1000 < 3 * sketch.relative_error()
+
+
+def test_hyperloglog_merge_counts_the_union():
+    left = HyperLogLog().add([f"ID-{i}" for i in range(0, 30000)])
+    right = HyperLogLog().add([f"ID-{i}" for i in range(20000, 50000)])
+    merged = left.merge(right)
+    assert abs(merged.estimate() - 50000) / 50000 < 3 * merged.relative_error()
+
+
+def test_hyperloglog_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=14).merge(HyperLogLog(precision=12))
+
+
+def test_hyperloglog_bytes_round_trip():
+    sketch = HyperLogLog(precision=12).add([f"ID-{i}" for i in range(3000)])
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == 12
+    assert np.array_equal(restored.registers, sketch.registers)
+    assert restored.estimate() == sketch.estimate()
+
+
+def test_estimate_group_sales_interval_covers_true_totals():
+    rng = np.random.default_rng(7)
+    fact = pd.DataFrame({'Region': rng.choice(['East', 'West', 'South'], size=5000),
+                         'Sales': rng.exponential(200.0, size=5000)})
+    truth = fact.groupby('Region')['Sales'].sum()
+
+    trials, covered = 200, 0
+    for seed in range(trials):
+        estimate = estimate_group_sales(sample_fact(fact, 0.1, seed=seed), 'Region').set_index('Region')
+        estimate = estimate.loc[truth.index]
+        covered += ((estimate['Sales_Low'] <= truth) & (truth <= estimate['Sales_High'])).sum()
+
+    # 95% intervals: coverage over 600 intervals should land close to 0.95
+    assert 0.9 <= covered / (3 * trials) <= 0.99
@@ -0,0 +1,170 @@
+import csv
+import os
+import time
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from files.watch import BACKPRESSURE_MARKER, InboxWatcher
+
+HEADER = ['Row ID', 'Order ID', 'Order Date', 'Ship Date', 'Ship Mode', 'Customer ID', 'Customer Name',
+          'Segment', 'Country', 'City', 'State', 'Postal Code', 'Region', 'Product ID', 'Category',
+          'Sub-Category', 'Product Name', 'Sales']
+
+
+def make_row(row_id, order_id, customer_id, product_id, sales, order_date='08-11-2017'):
+    return [row_id, order_id, order_date, '11-11-2017', 'Second Class', customer_id, f"Name {customer_id}",
+            'Consumer', 'United States', 'Henderson', 'Kentucky', 42420, 'South', product_id, 'Furniture',
+            'Chairs', f"Product {product_id}", sales]
+
+
+def write_extract(inbox, name, rows, age=0):
+    path = os.path.join(inbox, name)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+    return path
+
+
+def count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'sales.db'}")
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    path = tmp_path / 'inbox'
+    path.mkdir()
+    return str(path)
+
+
+def test_batch_flushes_when_batch_size_reached(engine, inbox):
+    watcher = InboxWatcher(engine, inbox, batch_size=2, max_latency=3600)
+
+    write_extract(inbox, 'a.csv', [make_row(1, 'O-1', 'C-1', 'P-1', 10.0)])
+    assert watcher.run_once() is False
+
+    write_extract(inbox, 'b.csv', [make_row(2, 'O-2', 'C-2', 'P-2', 20.0)])
+    assert watcher.run_once() is True
+    assert count(engine, 'fact_sales') == 2
+    assert count(engine, 'etl_load_log') == 1
+    assert count(engine, 'etl_batch_metrics') == 1
+    assert os.listdir(os.path.join(inbox, 'working')) == []
+
+
+def test_batch_flushes_when_max_latency_expires(engine, inbox):
+    watcher = InboxWatcher(engine, inbox, batch_size=10, max_latency=60)
+
+    write_extract(inbox, 'fresh.csv', [make_row(1, 'O-1', 'C-1', 'P-1', 10.0)])
+    assert watcher.run_once() is False
+
+    write_extract(inbox, 'old.csv', [make_row(2, 'O-2', 'C-2', 'P-2', 20.0)], age=120)
+    assert watcher.run_once() is True
+    assert count(engine, 'fact_sales') == 2
+    assert watcher.stats['max_freshness_seconds'] >= 120
+
+
+def test_backpressure_marker_appears_and_clears(engine, inbox):
+    watcher = InboxWatcher(engine, inbox, batch_size=10, max_latency=3600, max_pending=2)
+    marker = os.path.join(inbox, BACKPRESSURE_MARKER)
+
+    paths = [write_extract(inbox, f"{i}.csv", [make_row(i, f"O-{i}", 'C-1', 'P-1', 1.0)]) for i in range(3)]
+    watcher.run_once()
+    assert os.path.exists(marker)
+    assert watcher.backpressure is True
+
+    for path in paths[1:]:
+        os.remove(path)
+    watcher.run_once()
+    assert not os.path.exists(marker)
+    assert watcher.stats['backpressure_events'] == 1
+
+
+def test_dimension_keys_are_conformed_across_batches(engine, inbox):
+    watcher = InboxWatcher(engine, inbox, batch_size=1, max_latency=3600)
+
+    write_extract(inbox, 'a.csv', [make_row(1, 'O-1', 'C-1', 'P-1', 10.0),
+                                   make_row(2, 'O-2', 'C-2', 'P-1', 20.0)])
+    assert watcher.run_once() is True
+    write_extract(inbox, 'b.csv', [make_row(3, 'O-3', 'C-2', 'P-2', 30.0),
+                                   make_row(4, 'O-4', 'C-3', 'P-1', 40.0)])
+    assert watcher.run_once() is True
+
+    dim_customer = pd.read_sql("SELECT * FROM dim_customer", engine)
+    assert sorted(dim_customer['Customer_ID']) == ['C-1', 'C-2', 'C-3']
+    assert dim_customer['CustomerKey'].is_unique
+    assert count(engine, 'dim_product') == 2
+    assert count(engine, 'dim_date') == len(pd.read_sql("SELECT DISTINCT DateKey FROM dim_date", engine))
+
+    fact = pd.read_sql("SELECT * FROM fact_sales", engine)
+    merged = fact.merge(dim_customer, on='CustomerKey', how='left')
+    assert merged.set_index('Order_ID')['Customer_ID'].to_dict() == {
+        'O-1': 'C-1', 'O-2': 'C-2', 'O-3': 'C-2', 'O-4': 'C-3'}
+
+
+def test_failed_batch_resumes_from_checkpoint(engine, inbox, monkeypatch):
+    watcher = InboxWatcher(engine, inbox, batch_size=1, max_latency=3600, insert_batch_size=1)
+    rows = [make_row(i, f"O-{i}", f"C-{i}", 'P-1', float(i)) for i in range(1, 5)]
+    write_extract(inbox, 'a.csv', rows)
+
+    original_to_sql = pd.DataFrame.to_sql
+    fact_batches = []
+
+    def flaky_to_sql(df, name, *args, **kwargs):
+        if name == 'fact_sales':
+            fact_batches.append(len(df))
+            if len(fact_batches) == 3:
+                raise RuntimeError("lock wait timeout")
+        return original_to_sql(df, name, *args, **kwargs)
+
+    monkeypatch.setattr(pd.DataFrame, 'to_sql', flaky_to_sql)
+    assert watcher.run_once() is False
+    assert count(engine, 'fact_sales') == 2
+    assert count(engine, 'etl_load_log') == 0
+
+    monkeypatch.setattr(pd.DataFrame, 'to_sql', original_to_sql)
+    assert watcher.run_once() is True
+    fact = pd.read_sql("SELECT * FROM fact_sales", engine)
+    assert sorted(fact['Order_ID']) == ['O-1', 'O-2', 'O-3', 'O-4']
+    assert count(engine, 'dim_customer') == 4
+    assert count(engine, 'etl_load_log') == 1
+
+
+def test_repeatedly_failing_batch_stops_the_watcher(engine, inbox, monkeypatch):
+    watcher = InboxWatcher(engine, inbox, batch_size=1, max_latency=3600, max_attempts=2)
+    write_extract(inbox, 'a.csv', [make_row(1, 'O-1', 'C-1', 'P-1', 10.0)])
+
+    def failing_to_sql(df, name, *args, **kwargs):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(pd.DataFrame, 'to_sql', failing_to_sql)
+    assert watcher.run_once() is False
+    with pytest.raises(RuntimeError, match="failed 2 times"):
+        watcher.run_once()
+    assert len(os.listdir(os.path.join(inbox, 'working'))) == 1
+
+
+def test_files_that_vanish_before_claim_are_skipped(engine, inbox, monkeypatch):
+    watcher = InboxWatcher(engine, inbox, batch_size=2, max_latency=3600)
+    write_extract(inbox, 'a.csv', [make_row(1, 'O-1', 'C-1', 'P-1', 10.0)])
+    ghost = os.path.join(inbox, 'gone.csv')
+
+    # The producer deletes gone.csv between the inbox scan and the claim
+    scan = watcher._pending_files
+    monkeypatch.setattr(watcher, '_pending_files', lambda: scan() + [ghost])
+    assert watcher.run_once() is True
+    assert count(engine, 'fact_sales') == 1
+
+    # Nothing left to claim: no batch is started and the next poll rescans
+    assert watcher.run_once() is False
+    assert os.listdir(os.path.join(inbox, 'working')) == []